@@ -12,14 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Dict, List, Optional
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import numba
 import numpy as np
-
-from openfermion.linalg import wedge
-from openfermion.ops import InteractionRDM
+from scipy.linalg import eigh, eigvalsh
 
 import recirq.hfvqe.util as ccu
-from recirq.hfvqe.objective import generate_hamiltonian
 
 
 def kdelta(i: int, j: int):
@@ -28,16 +27,90 @@ def kdelta(i: int, j: int):
 
 
 def trace_distance(rho: np.ndarray, sigma: np.ndarray) -> float:
-    """Compute the trace distance between two matrices.
+    """Compute the trace distance between two Hermitian matrices.
 
     Args:
         rho: matrix 1
         sigma: matrix 2
 
     Returns:
-        The trace distance.
+        The trace distance, 0.5 * sum(|eigenvalues of rho - sigma|).
+    """
+    return 0.5 * np.sum(np.abs(eigvalsh(rho - sigma)))
+
+
+def _sample_pair_covariance(samples: np.ndarray,
+                            pair_starts: np.ndarray) -> np.ndarray:
+    """Covariance of the mean 0.5 (n_{k + 1} - n_k) estimators from samples.
+
+    Args:
+        samples: (num_samples, num_qubits) array of measured bits.
+        pair_starts: column k of each measured (k, k + 1) pair.
+
+    Returns:
+        Covariance matrix between the pair estimators, already divided by the
+        number of samples because CLT converges to N(mu, sigma**2 / n_samples).
+    """
+    cov = np.cov(samples, rowvar=False)
+    return _assemble_pair_covariance(cov, pair_starts, pair_starts + 1,
+                                     len(samples))
+
+
+@numba.njit
+def _assemble_pair_covariance(cov: np.ndarray, q0s: np.ndarray,
+                              q1s: np.ndarray,
+                              num_samples: int) -> np.ndarray:
+    """Gather Cov(0.5 (n_b - n_a), 0.5 (n_d - n_c)) from the qubit covariance.
+
+    Args:
+        cov: sample covariance matrix between the measured qubits.
+        q0s: first qubit index of each pair.
+        q1s: second qubit index of each pair.
+        num_samples: number of samples cov was estimated from.
+
+    Returns:
+        Covariance matrix between the pair estimators divided by num_samples.
     """
-    return 0.5 * np.linalg.norm(rho - sigma, 1)
+    num_pairs = q0s.shape[0]
+    pair_cov = np.empty((num_pairs, num_pairs))
+    for ridx in range(num_pairs):
+        a0, a1 = q0s[ridx], q1s[ridx]
+        # Cov-mat is symmetric so only need upper right val
+        for cidx in range(ridx, num_pairs):
+            b0, b1 = q0s[cidx], q1s[cidx]
+            pair_cov[ridx, cidx] = 0.25 * (cov[a1, b1] - cov[a1, b0] -
+                                           cov[a0, b1] +
+                                           cov[a0, b0]) / num_samples
+            pair_cov[cidx, ridx] = pair_cov[ridx, cidx]
+    return pair_cov
+
+
+def _check_positive_semidefinite(cov: np.ndarray, measure_type: str,
+                                 circuit_idx: int,
+                                 tol: float = 1.0E-12) -> np.ndarray:
+    """Raise a ValueError if a covariance matrix is not positive semidefinite.
+
+    A Cholesky factorization stops at the first negative pivot, which is
+    cheaper than computing the full spectrum. cov is shifted by
+    tol * max(1, ||cov||) * I so that roundoff-level negative eigenvalues of
+    singular covariances are accepted.
+
+    Args:
+        cov: covariance matrix to check.
+        measure_type: 'xy_even', 'xy_odd' or 'z', used in the error message.
+        circuit_idx: permutation circuit index, used in the error message.
+        tol: shift relative to the scale of cov.
+
+    Returns:
+        The Cholesky factor of the shifted cov.
+    """
+    shift = tol * max(1.0, np.linalg.norm(cov))
+    try:
+        return np.linalg.cholesky(cov + shift * np.eye(cov.shape[0]))
+    except np.linalg.LinAlgError:
+        raise ValueError(
+            "covariance matrix for {}:{} not postiive semidefinite".format(
+                measure_type, circuit_idx))
 
 
 def compute_opdm(
@@ -48,74 +121,52 @@ def compute_opdm(
     Args:
         results_dict: Results dictionary generated from
             OpdmFunctional._calculate_data
-        return_variance: Optional return covariances of the opdm
+        return_variance: Optional return covariances of the opdm. Their
+            Cholesky factors are cached under 'cholesky' for resample_opdm.
     """
     qubits = results_dict['qubits']
     num_qubits = len(qubits)
     opdm = np.zeros((num_qubits, num_qubits))
     variance_dict = {'xy_even': {}, 'xy_odd': {}, 'z': {}}
+    cholesky_dict = {'xy_even': {}, 'xy_odd': {}, 'z': {}}
     for circuit_idx, permutation in enumerate(
             results_dict['qubit_permutations']):
-        for pair_idx in range(num_qubits - 1):
-            if pair_idx % 2 == 0:
-                data = results_dict['xy_even'][circuit_idx]
-            else:
-                data = results_dict['xy_odd'][circuit_idx]
-            q0, q1 = qubits[pair_idx:pair_idx + 2]
-            qA, qB = permutation[pair_idx:pair_idx + 2]
-            opdm[qA, qB] += np.mean(data[q1] - data[q0], axis=0) * 0.5
-            opdm[qB, qA] += np.mean(data[q1] - data[q0], axis=0) * 0.5
+        # Sample matrices with columns in the order of `qubits`.
+        xy_even_samples = \
+            results_dict['xy_even'][circuit_idx][qubits].to_numpy()
+        xy_odd_samples = results_dict['xy_odd'][circuit_idx][qubits].to_numpy()
+
+        # pair idx measures 0.5 (n_{idx + 1} - n_idx) in the xy_even
+        # circuit for even idx and in the xy_odd circuit for odd idx.
+        pair_means = np.zeros(num_qubits - 1)
+        for samples, start in [(xy_even_samples, 0), (xy_odd_samples, 1)]:
+            qubit_means = samples.mean(axis=0)
+            pair_means[start::2] = 0.5 * np.diff(qubit_means)[start::2]
+        qAs = np.asarray(permutation[:-1])
+        qBs = np.asarray(permutation[1:])
+        np.add.at(opdm, (qAs, qBs), pair_means)
+        np.add.at(opdm, (qBs, qAs), pair_means)
 
         if return_variance:
-            # get covariance matrices
-            even_pairs = [
-                qubits[idx:idx + 2] for idx in np.arange(0, num_qubits - 1, 2)
-            ]
-            odd_pairs = [
-                qubits[idx:idx + 2] for idx in np.arange(1, num_qubits - 1, 2)
-            ]
-            data = results_dict['xy_even'][circuit_idx]
-            even_cov_mat = np.zeros((len(even_pairs), len(even_pairs)),
-                                    dtype=float)
-            for ridx, (q0_a, q1_a) in enumerate(even_pairs):
-                for cidx, (q0_b, q1_b) in enumerate(even_pairs):
-                    for qid_a, coeff_a in [(q0_a, -0.5), (q1_a, 0.5)]:
-                        for qid_b, coeff_b in [(q0_b, -0.5), (q1_b, 0.5)]:
-                            # get Cov(qid_a, qid_b)
-                            # Cov-mat is symmetric so only need upper right val
-                            even_cov_mat[ridx, cidx] += (
-                                coeff_a * coeff_b *
-                                data[[qid_a, qid_b]].cov().to_numpy()[0, 1])
-                    # divide covariance by number of samples
-                    # because CLT converges to N(mu, sigma**2 / n_samples)
-                    even_cov_mat[ridx, cidx] /= len(data[q0_a])
+            # get covariance matrices. Pair idx covers sample columns idx and
+            # idx + 1.
+            even_pairs = np.arange(0, num_qubits - 1, 2)
+            odd_pairs = np.arange(1, num_qubits - 1, 2)
+            even_cov_mat = _sample_pair_covariance(xy_even_samples, even_pairs)
 
             variance_dict['xy_even'][circuit_idx] = even_cov_mat
-            w, _ = np.linalg.eigh(even_cov_mat * len(data[q0_a]))
-            if not np.all(w >= 0):
-                raise ValueError(
-                    "covariance matrix for xy_even:{} not postiive semidefinite"
-                    .format(circuit_idx))
-
-            data = results_dict['xy_odd'][circuit_idx]
-            odd_cov_mat = np.zeros((len(odd_pairs), len(odd_pairs)),
-                                   dtype=float)
-            for ridx, (q0_a, q1_a) in enumerate(odd_pairs):
-                for cidx, (q0_b, q1_b) in enumerate(odd_pairs):
-                    for qid_a, coeff_a in [(q0_a, -0.5), (q1_a, 0.5)]:
-                        for qid_b, coeff_b in [(q0_b, -0.5), (q1_b, 0.5)]:
-                            odd_cov_mat[ridx, cidx] += (
-                                coeff_a * coeff_b *
-                                data[[qid_a, qid_b]].cov().to_numpy()[0, 1])
-                    odd_cov_mat[ridx, cidx] /= len(data[q0_a])
+            factor = _check_positive_semidefinite(
+                even_cov_mat * len(xy_even_samples), 'xy_even', circuit_idx)
+            cholesky_dict['xy_even'][circuit_idx] = _cholesky_cache_entry(
+                even_cov_mat, factor / np.sqrt(len(xy_even_samples)))
+
+            odd_cov_mat = _sample_pair_covariance(xy_odd_samples, odd_pairs)
 
             variance_dict['xy_odd'][circuit_idx] = odd_cov_mat
-            w, _ = np.linalg.eigh(odd_cov_mat * len(data[q0_a]))
-            if not np.all(w >= 0):
-                raise ValueError(
-                    "covariance matrix for xy_odd:{} not postiive semidefinite".
-                    format(circuit_idx))
-            assert np.all(w >= 0)
+            factor = _check_positive_semidefinite(
+                odd_cov_mat * len(xy_odd_samples), 'xy_odd', circuit_idx)
+            cholesky_dict['xy_odd'][circuit_idx] = _cholesky_cache_entry(
+                odd_cov_mat, factor / np.sqrt(len(xy_odd_samples)))
 
         if circuit_idx == 0:  # No re-ordering
             for qubit_idx, q in enumerate(qubits):
@@ -126,13 +177,106 @@ def compute_opdm(
                 variance_dict['z'][circuit_idx] = \
                 results_dict['z'][circuit_idx][qubits].cov().to_numpy() / \
                 len(data)
+                cholesky_dict['z'][circuit_idx] = _cholesky_cache_entry(
+                    variance_dict['z'][circuit_idx])
 
     if return_variance:
+        variance_dict['cholesky'] = cholesky_dict
         return opdm, variance_dict
 
     return opdm
 
 
+@lru_cache(maxsize=None)
+def _permutation_pairs(num_qubits: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Orbital index pairs measured by each permutation circuit.
+
+    Args:
+        num_qubits: number of qubits (spatial orbitals).
+
+    Returns:
+        Read-only integer arrays of shape (num_permutations, P, 2) holding the
+        even and odd (i, j) pairs of each permutation from
+        util.generate_permutations.
+    """
+    qubit_permutations = np.array(ccu.generate_permutations(num_qubits),
+                                  dtype=int)
+    even_starts = np.arange(0, num_qubits - 1, 2)
+    odd_starts = np.arange(1, num_qubits - 1, 2)
+    e_pairs = np.stack([
+        qubit_permutations[:, even_starts],
+        qubit_permutations[:, even_starts + 1]
+    ], axis=-1)
+    o_pairs = np.stack([
+        qubit_permutations[:, odd_starts],
+        qubit_permutations[:, odd_starts + 1]
+    ], axis=-1)
+    e_pairs.flags.writeable = False
+    o_pairs.flags.writeable = False
+    return e_pairs, o_pairs
+
+
+def _pair_covariance(opdm: np.ndarray, pairs: np.ndarray) -> np.ndarray:
+    """Covariance of the 0.5 (i^ j + j^ i) estimators for a Gaussian state.
+
+    Args:
+        opdm: 1-RDM
+        pairs: integer array of shape (..., P, 2) holding the (i, j) index
+            pairs. Leading dimensions are treated as a batch.
+
+    Returns:
+        (..., P, P) covariance matrices between the pair estimators.
+    """
+    i, j = pairs[..., 0], pairs[..., 1]
+    cov_mat = np.zeros(pairs.shape[:-1] + pairs.shape[-2:-1], dtype=float)
+    # Cov(a^ b, c^ d) = opdm[a, d] * kdelta(b, c) - opdm[a, d] * opdm[c, b]
+    # summed over both orderings of the row pair and the column pair.
+    for a, b in [(i, j), (j, i)]:
+        a, b = a[..., :, None], b[..., :, None]
+        for c, d in [(i, j), (j, i)]:
+            c, d = c[..., None, :], d[..., None, :]
+            cov_mat += (opdm[a, d] * ((b == c) - opdm[c, b])).real
+    # 0.25 comes from the fact that we estimate 0.5 (i^ j + j^ i)
+    return 0.25 * cov_mat
+
+
+def _cholesky_factor(cov: np.ndarray) -> np.ndarray:
+    """Factor L with L @ L.T == cov for drawing correlated normal samples.
+
+    Args:
+        cov: positive semidefinite covariance matrix.
+
+    Returns:
+        The Cholesky factor of cov, or a scaled eigenbasis if cov is singular.
+    """
+    try:
+        return np.linalg.cholesky(cov)
+    except np.linalg.LinAlgError:
+        # Singular covariances (e.g. from number conservation) have no
+        # Cholesky factor.
+        w, v = eigh(cov, driver='evr')
+        return v * np.sqrt(np.clip(w, 0, None))
+
+
+def _cholesky_cache_entry(
+        cov: np.ndarray,
+        factor: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Entry for a variance dictionary's 'cholesky' cache.
+
+    Args:
+        cov: covariance matrix stored in the variance dictionary.
+        factor: Optional Cholesky factor of cov that is already known, e.g.
+            from _check_positive_semidefinite. Computed if not given.
+
+    Returns:
+        A copy of cov and its Cholesky factor. resample_opdm only reuses the
+        factor while the stored covariance still equals the copy.
+    """
+    if factor is None:
+        factor = _cholesky_factor(cov)
+    return cov.copy(), factor
+
+
 def covariance_construction_from_opdm(opdm: np.ndarray,
                                       num_samples: int):  # testpragma: no cover
     """Covariance generation from the opdm is from a Gaussian state.
@@ -142,117 +286,131 @@ def covariance_construction_from_opdm(opdm: np.ndarray,
         num_samples: Number of samples to estimate the 1-RDM
 
     Returns:
-        Dictionary of covariances
+        Dictionary of covariances. The Cholesky factors of the covariances
+        are cached under 'cholesky' for resample_opdm.
     """
     num_qubits = opdm.shape[0]
-    qubit_permutations = ccu.generate_permutations(num_qubits)
     variance_dict = {'xy_even': {}, 'xy_odd': {}, 'z': {}}
-
-    def cov_func(i, j, p, q):
-        return opdm[i, q] * kdelta(j, p) - opdm[i, q] * opdm[p, j]
-
-    for circuit_idx, permutation in enumerate(qubit_permutations):
-        e_real_pairs = [
-            permutation[idx:idx + 2] for idx in np.arange(0, num_qubits - 1, 2)
-        ]
-        o_real_pairs = [
-            permutation[idx:idx + 2] for idx in np.arange(1, num_qubits - 1, 2)
-        ]
-        even_cov_mat = np.zeros((len(e_real_pairs), len(e_real_pairs)),
-                                dtype=float)
-        for ridx, (i, j) in enumerate(e_real_pairs):
-            for cidx, (p, q) in enumerate(e_real_pairs):
-                # 0.25 comes from the fact that we estimate 0.5 (i^ j + j^ i)
-                even_cov_mat[ridx, cidx] = 0.25 * (
-                    cov_func(i, j, p, q) + cov_func(i, j, q, p) +
-                    cov_func(j, i, p, q) + cov_func(j, i, q, p))
-
-        w, _ = np.linalg.eigh(even_cov_mat)
-        if not np.all(w >= 0):
-            raise ValueError(
-                "covariance matrix for xy_even:{} not postiive semidefinite".
-                format(circuit_idx))
-
-        variance_dict['xy_even'][circuit_idx] = even_cov_mat / num_samples
-
-        odd_cov_mat = np.zeros((len(o_real_pairs), len(o_real_pairs)),
-                               dtype=float)
-        for ridx, (i, j) in enumerate(o_real_pairs):
-            for cidx, (p, q) in enumerate(o_real_pairs):
-                odd_cov_mat[ridx, cidx] = 0.25 * (
-                    cov_func(i, j, p, q) + cov_func(i, j, q, p) +
-                    cov_func(j, i, p, q) + cov_func(j, i, q, p))
-        w, _ = np.linalg.eigh(odd_cov_mat)
-        if not np.all(w >= 0):
-            raise ValueError(
-                "covariance matrix for xy_odd:{} not postiive semidefinite".
-                format(circuit_idx))
-
-        variance_dict['xy_odd'][circuit_idx] = odd_cov_mat / num_samples
-
-        if circuit_idx == 0:
-            z_cov_mat = np.zeros((num_qubits, num_qubits), dtype=float)
-            for ridx, i in enumerate(range(num_qubits)):
-                for cidx, p in enumerate(range(num_qubits)):
-                    z_cov_mat[ridx, cidx] = cov_func(i, i, p, p)
-            w, _ = np.linalg.eigh(z_cov_mat)
-            if not np.all(w >= -1.0E-15):
-                raise ValueError(
-                    "covariance matrix for z:{} not postiive semidefinite".
-                    format(circuit_idx))
-
-            variance_dict['z'][circuit_idx] = z_cov_mat / num_samples
-
+    cholesky_dict = {'xy_even': {}, 'xy_odd': {}, 'z': {}}
+
+    # Covariances for all permutation circuits at once, stacked along axis 0.
+    e_real_pairs, o_real_pairs = _permutation_pairs(num_qubits)
+    for measure_type, real_pairs in [('xy_even', e_real_pairs),
+                                     ('xy_odd', o_real_pairs)]:
+        cov_mats = _pair_covariance(opdm, real_pairs)
+        for circuit_idx, cov_mat in enumerate(cov_mats):
+            factor = _check_positive_semidefinite(cov_mat, measure_type,
+                                                  circuit_idx)
+            variance_dict[measure_type][circuit_idx] = cov_mat / num_samples
+            cholesky_dict[measure_type][circuit_idx] = _cholesky_cache_entry(
+                variance_dict[measure_type][circuit_idx],
+                factor / np.sqrt(num_samples))
+
+    # Cov(n_i, n_p) = opdm[i, p] * kdelta(i, p) - opdm[i, p] * opdm[p, i]
+    z_cov_mat = (np.diag(np.diagonal(opdm)) - opdm * opdm.T).real
+    factor = _check_positive_semidefinite(z_cov_mat, 'z', 0)
+
+    variance_dict['z'][0] = z_cov_mat / num_samples
+    cholesky_dict['z'][0] = _cholesky_cache_entry(variance_dict['z'][0],
+                                                  factor / np.sqrt(num_samples))
+
+    variance_dict['cholesky'] = cholesky_dict
     return variance_dict
 
 
-def resample_opdm(opdm: np.ndarray,
-                  var_dict: Dict) -> np.ndarray:  # testpragma: no cover
+def resample_opdm(
+        opdm: np.ndarray,
+        var_dict: Dict,
+        rng: Optional[np.random.Generator] = None
+) -> np.ndarray:  # testpragma: no cover
     """Resample an 1-RDM assuming Gaussian statistics.
 
     Args:
         opdm: mean-values
-        var_dict: dictionary of covariances indexed by circuit and permutation
-        fixed_trace_psd_projection: Boolean for if fixed trace positive
-            projection should be applied
+        var_dict: dictionary of covariances indexed by circuit and permutation.
+            Cholesky factors cached under 'cholesky' by compute_opdm or
+            covariance_construction_from_opdm are reused as long as the
+            corresponding covariance is unchanged; otherwise the covariance
+            is factored again.
+        rng: Optional random number generator. Defaults to a freshly seeded
+            np.random.default_rng().
     """
+    if rng is None:
+        rng = np.random.default_rng()
+    cholesky_dict = var_dict.get('cholesky', {})
+
+    def factor(measure_type, circuit_idx):
+        cov = var_dict[measure_type][circuit_idx]
+        cached = cholesky_dict.get(measure_type, {}).get(circuit_idx)
+        if cached is not None and np.array_equal(cached[0], cov):
+            return cached[1]
+        return _cholesky_factor(cov)
+
     num_qubits = opdm.shape[0]
-    qubit_permutations = ccu.generate_permutations(num_qubits)
+    e_real_pairs, o_real_pairs = _permutation_pairs(num_qubits)
+    circuit_indices = range(len(e_real_pairs))
+    e_factors = np.array([factor('xy_even', idx) for idx in circuit_indices])
+    o_factors = np.array([factor('xy_odd', idx) for idx in circuit_indices])
+    e_normals = rng.standard_normal(e_real_pairs.shape[:2])
+    o_normals = rng.standard_normal(o_real_pairs.shape[:2])
+
     new_opdm = np.zeros_like(opdm)
-    for circuit_idx, permutation in enumerate(qubit_permutations):
-        e_real_pairs = [
-            permutation[idx:idx + 2] for idx in np.arange(0, num_qubits - 1, 2)
-        ]
-        o_real_pairs = [
-            permutation[idx:idx + 2] for idx in np.arange(1, num_qubits - 1, 2)
-        ]
-
-        # get all the even and odd pairs
-        even_means = [opdm[pp[0], pp[1]] for pp in e_real_pairs]
-        opdm_terms = np.random.multivariate_normal(
-            mean=even_means, cov=var_dict['xy_even'][circuit_idx])
-        for idx, (pp0, pp1) in enumerate(e_real_pairs):
-            new_opdm[pp0, pp1] = opdm_terms[idx]
-            new_opdm[pp1, pp0] = opdm_terms[idx]
-
-        odd_means = [opdm[pp[0], pp[1]] for pp in o_real_pairs]
-        opdm_terms = np.random.multivariate_normal(
-            mean=odd_means, cov=var_dict['xy_odd'][circuit_idx])
-        for idx, (pp0, pp1) in enumerate(o_real_pairs):
-            new_opdm[pp0, pp1] = opdm_terms[idx]
-            new_opdm[pp1, pp0] = opdm_terms[idx]
-
-        if circuit_idx == 0:
-            # resample_diagonal_terms
-            opdm_diagonal = np.random.multivariate_normal(
-                mean=np.diagonal(opdm), cov=var_dict['z'][circuit_idx])
-
-            # because fill_diagonal documentat seems out of date.
-            new_opdm[np.diag_indices_from(new_opdm)] = opdm_diagonal
+    _scatter_pair_samples(new_opdm, opdm, e_real_pairs, e_factors, e_normals,
+                          o_real_pairs, o_factors, o_normals)
+
+    # resample_diagonal_terms
+    opdm_diagonal = np.diagonal(opdm) + factor('z', 0) @ rng.standard_normal(
+        num_qubits)
+
+    # because fill_diagonal documentat seems out of date.
+    new_opdm[np.diag_indices_from(new_opdm)] = opdm_diagonal
 
     return new_opdm
 
 
+@numba.njit
+def _scatter_pair_samples(new_opdm: np.ndarray, opdm: np.ndarray,
+                          e_pairs: np.ndarray, e_factors: np.ndarray,
+                          e_normals: np.ndarray, o_pairs: np.ndarray,
+                          o_factors: np.ndarray, o_normals: np.ndarray):
+    """Write correlated samples of the measured pairs into new_opdm.
+
+    Circuits are visited in order, even pairs before odd pairs, so pairs that
+    are measured by more than one circuit keep the last sample.
+
+    Args:
+        new_opdm: output 1-RDM, updated in place.
+        opdm: mean-values
+        e_pairs: (num_permutations, P, 2) even pairs of each circuit.
+        e_factors: (num_permutations, P, P) Cholesky factors of the even pair
+            covariances.
+        e_normals: (num_permutations, P) standard normal draws.
+        o_pairs: odd pairs, as e_pairs.
+        o_factors: odd pair Cholesky factors, as e_factors.
+        o_normals: standard normal draws, as e_normals.
+    """
+    for circuit_idx in range(e_pairs.shape[0]):
+        _scatter_block_samples(new_opdm, opdm, e_pairs[circuit_idx],
+                               e_factors[circuit_idx], e_normals[circuit_idx])
+        _scatter_block_samples(new_opdm, opdm, o_pairs[circuit_idx],
+                               o_factors[circuit_idx], o_normals[circuit_idx])
+
+
+@numba.njit
+def _scatter_block_samples(new_opdm: np.ndarray, opdm: np.ndarray,
+                           pairs: np.ndarray, factor: np.ndarray,
+                           normals: np.ndarray):
+    """Write opdm[pairs] + factor @ normals symmetrically into new_opdm."""
+    num_pairs = pairs.shape[0]
+    for ridx in range(num_pairs):
+        p, q = pairs[ridx, 0], pairs[ridx, 1]
+        opdm_term = opdm[p, q]
+        for cidx in range(num_pairs):
+            opdm_term += factor[ridx, cidx] * normals[cidx]
+        new_opdm[p, q] = opdm_term
+        new_opdm[q, p] = opdm_term
+
+
 def energy_from_opdm(opdm, constant, one_body_tensor, two_body_tensor):
     """Evaluate the energy of an opdm assuming the 2-RDM is opdm ^ opdm.
 
@@ -263,14 +421,16 @@ def energy_from_opdm(opdm, constant, one_body_tensor, two_body_tensor):
         one_body_tensor: spatial one-body integrals
         two_body_tensor: spatial two-body integrals
     """
-    spin_opdm = np.kron(opdm, np.eye(2))
-    spin_tpdm = 2 * wedge(spin_opdm, spin_opdm, (1, 1), (1, 1))
-    molecular_hamiltonian = generate_hamiltonian(
-        constant=constant,
-        one_body_integrals=one_body_tensor,
-        two_body_integrals=two_body_tensor)
-    rdms = InteractionRDM(spin_opdm, spin_tpdm)
-    return rdms.expectation(molecular_hamiltonian).real
+    # The spin-orbital 1-RDM is opdm on each spin block and the 2-RDM is
+    # <i^ j^ k l> = D[i, l] D[j, k] - D[i, k] D[j, l]. Summing the spin labels
+    # of generate_hamiltonian's coefficients analytically leaves contractions
+    # over the spatial tensors only.
+    one_body_energy = 2 * np.einsum('pq,pq', one_body_tensor, opdm)
+    two_body_energy = (
+        2 * np.einsum('pqrs,ps,qr', two_body_tensor, opdm, opdm,
+                      optimize=True) -
+        np.einsum('pqrs,pr,qs', two_body_tensor, opdm, opdm, optimize=True))
+    return (constant + one_body_energy + two_body_energy).real
 
 
 def mcweeny_purification(rho: np.ndarray,
@@ -286,9 +446,13 @@ def mcweeny_purification(rho: np.ndarray,
     """
     error = np.inf
     new_rho = rho.copy()
+    # P**2 from the error check is reused by the next update, so each
+    # iteration costs two matrix products.
+    rho_sq = new_rho @ new_rho
     while error > threshold:
-        new_rho = 3 * (new_rho @ new_rho) - 2 * (new_rho @ new_rho @ new_rho)
-        error = np.linalg.norm(new_rho @ new_rho - new_rho)
+        new_rho = 3 * rho_sq - 2 * (rho_sq @ new_rho)
+        rho_sq = new_rho @ new_rho
+        error = np.linalg.norm(rho_sq - new_rho)
     return new_rho
 
 
@@ -308,12 +472,12 @@ def fidelity_witness(target_unitary: np.ndarray, omega: List[int],
         Fidelity witness, a floating point number less than 1. This can be
             negative!
     """
-    undone_opdm = target_unitary.conj().T @ measured_opdm @ target_unitary
-    fidelity_witness_val = 1
-    for i in range(measured_opdm.shape[0]):
-        fidelity_witness_val -= undone_opdm[i, i] + omega[i] - 2 * omega[i] * \
-                                undone_opdm[i, i]
-    return fidelity_witness_val
+    undone_opdm = np.linalg.multi_dot(
+        [target_unitary.conj().T, measured_opdm, target_unitary])
+    undone_occupations = np.diagonal(undone_opdm)
+    omega = np.asarray(omega)
+    return 1 - np.sum(undone_occupations + omega -
+                      2 * omega * undone_occupations)
 
 
 def fidelity(target_unitary: np.ndarray, measured_opdm: np.ndarray) -> float:
@@ -323,9 +487,11 @@ def fidelity(target_unitary: np.ndarray, measured_opdm: np.ndarray) -> float:
         target_unitary: unitary representing basis transformation.
         measured_opdm: purified opdm.
     """
-    w, v = np.linalg.eigh(measured_opdm)
+    w, v = eigh(measured_opdm, driver='evr')
     eig_of_one_idx = np.where(np.isclose(w, 1))[0]
     occupied_eigvects = v[:, eig_of_one_idx]
-    return abs(
-        np.linalg.det(target_unitary[:, :len(eig_of_one_idx)].conj().T
-                      @ occupied_eigvects))**2
+    overlap = target_unitary[:, :len(eig_of_one_idx)].conj().T @ \
+        occupied_eigvects
+    # |det|**2 from the log-determinant avoids under/overflow of det itself.
+    _, log_abs_det = np.linalg.slogdet(overlap)
+    return float(np.exp(2 * log_abs_det))
@@ -14,13 +14,18 @@
 
 from itertools import product
 import numpy as np
+import pandas as pd
+import pytest
 import scipy as sp
 from recirq.hfvqe.circuits import rhf_params_to_matrix
 from recirq.hfvqe.analysis import (trace_distance, kdelta, energy_from_opdm,
                                    fidelity_witness, fidelity,
-                                   mcweeny_purification)
+                                   mcweeny_purification,
+                                   covariance_construction_from_opdm,
+                                   compute_opdm, resample_opdm)
 from recirq.hfvqe.molecular_example import make_h6_1_3, make_h3_2_5
 from recirq.hfvqe.gradient_hf import rhf_func_generator
+from recirq.hfvqe.util import generate_permutations
 
 
 def test_kdelta():
@@ -34,6 +39,13 @@ def test_trace_distance():
     assert np.isclose(trace_distance(rho, rho), 0.)
     assert np.isclose(trace_distance(rho, sigma), 32.0)
 
+    zero = np.array([[1., 0.], [0., 0.]])
+    plus = np.array([[0.5, 0.5], [0.5, 0.5]])
+    assert np.isclose(trace_distance(zero, plus), np.sqrt(0.5))
+
+    with pytest.raises(ValueError):
+        trace_distance(zero, np.full((2, 2), np.nan))
+
 
 def test_energy_from_opdm():
     """Build test assuming sampling functions work"""
@@ -139,6 +151,10 @@ def test_fidelity():
     opdm = 0.5 * (opdm + opdm.T)
     assert np.isclose(fidelity(u, opdm), 0.3532702370138279)
 
+    opdm[0, 0] = np.nan
+    with pytest.raises(ValueError):
+        fidelity(u, opdm)
+
 
 def test_fidelity_witness():
     parameters = np.array([0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9])
@@ -176,3 +192,133 @@ def test_fidelity_witness():
 
     # higher than fidelity because of particle number breaking
     assert np.isclose(fidelity_witness(u, omega, opdm), 0.7721525013371697)
+
+
+def test_covariance_construction_from_opdm():
+    parameters = np.array([0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9])
+    u = sp.linalg.expm(rhf_params_to_matrix(parameters, 6))
+    opdm = u[:, :3] @ u[:, :3].conj().T
+    num_samples = 1000
+    var_dict = covariance_construction_from_opdm(opdm, num_samples)
+
+    def cov_func(i, j, p, q):
+        return opdm[i, q] * kdelta(j, p) - opdm[i, q] * opdm[p, j]
+
+    for circuit_idx, permutation in enumerate(generate_permutations(6)):
+        for key, start in [('xy_even', 0), ('xy_odd', 1)]:
+            pairs = [permutation[idx:idx + 2] for idx in range(start, 5, 2)]
+            true_cov_mat = np.zeros((len(pairs), len(pairs)))
+            for ridx, (i, j) in enumerate(pairs):
+                for cidx, (p, q) in enumerate(pairs):
+                    true_cov_mat[ridx, cidx] = 0.25 * (
+                        cov_func(i, j, p, q) + cov_func(i, j, q, p) +
+                        cov_func(j, i, p, q) + cov_func(j, i, q, p))
+            assert np.allclose(var_dict[key][circuit_idx],
+                               true_cov_mat / num_samples)
+
+    true_z_cov_mat = np.zeros((6, 6))
+    for i, p in product(range(6), repeat=2):
+        true_z_cov_mat[i, p] = cov_func(i, i, p, p)
+    assert list(var_dict['z'].keys()) == [0]
+    assert np.allclose(var_dict['z'][0], true_z_cov_mat / num_samples)
+
+    # A complex-typed opdm gives the same real covariances.
+    complex_var_dict = covariance_construction_from_opdm(
+        opdm.astype(np.complex128), num_samples)
+    for key in ['xy_even', 'xy_odd', 'z']:
+        for circuit_idx, cov_mat in complex_var_dict[key].items():
+            assert np.isrealobj(cov_mat)
+            assert np.allclose(cov_mat, var_dict[key][circuit_idx])
+
+    with pytest.raises(ValueError, match='not postiive semidefinite'):
+        covariance_construction_from_opdm(-np.eye(6), num_samples)
+
+
+def test_covariance_construction_from_opdm_roundoff():
+    # Pure Slater determinants have singular z covariances whose computed
+    # eigenvalues can be slightly negative. They must not be rejected.
+    np.random.seed(3)
+    for n in range(6, 13):
+        for _ in range(20):
+            kappa = np.random.randn(n, n)
+            u = sp.linalg.expm(kappa - kappa.T)
+            opdm = u[:, :n // 2] @ u[:, :n // 2].T
+            covariance_construction_from_opdm(opdm, 1000)
+
+
+def test_compute_opdm_variance():
+    np.random.seed(5)
+    qubits = ['q{}'.format(i) for i in range(5)]
+    qubit_permutations = generate_permutations(5)
+    results_dict = {'qubits': qubits, 'qubit_permutations': qubit_permutations}
+    for key in ['z', 'xy_even', 'xy_odd']:
+        results_dict[key] = {
+            circuit_idx: pd.DataFrame(np.random.randint(0, 2, (50, 5)),
+                                      columns=qubits)
+            for circuit_idx in range(len(qubit_permutations))
+        }
+    opdm, var_dict = compute_opdm(results_dict, return_variance=True)
+    assert np.allclose(opdm, compute_opdm(results_dict))
+
+    true_opdm = np.zeros((5, 5))
+    for circuit_idx, permutation in enumerate(qubit_permutations):
+        for pair_idx in range(4):
+            key = 'xy_even' if pair_idx % 2 == 0 else 'xy_odd'
+            data = results_dict[key][circuit_idx]
+            q0, q1 = qubits[pair_idx:pair_idx + 2]
+            qA, qB = permutation[pair_idx:pair_idx + 2]
+            true_opdm[qA, qB] += 0.5 * np.mean(data[q1] - data[q0])
+            true_opdm[qB, qA] += 0.5 * np.mean(data[q1] - data[q0])
+    true_opdm[np.diag_indices(5)] = results_dict['z'][0].mean().to_numpy()
+    assert np.allclose(opdm, true_opdm)
+
+    for key, start in [('xy_even', 0), ('xy_odd', 1)]:
+        for circuit_idx in range(len(qubit_permutations)):
+            data = results_dict[key][circuit_idx]
+            pairs = [qubits[idx:idx + 2] for idx in range(start, 4, 2)]
+            true_cov_mat = np.zeros((len(pairs), len(pairs)))
+            for ridx, (q0_a, q1_a) in enumerate(pairs):
+                for cidx, (q0_b, q1_b) in enumerate(pairs):
+                    true_cov_mat[ridx, cidx] = np.cov(
+                        0.5 * (data[q1_a] - data[q0_a]),
+                        0.5 * (data[q1_b] - data[q0_b]))[0, 1] / len(data)
+            assert np.allclose(var_dict[key][circuit_idx], true_cov_mat)
+
+    assert np.allclose(var_dict['z'][0],
+                       results_dict['z'][0].cov().to_numpy() / 50)
+
+    for key in ['xy_even', 'xy_odd', 'z']:
+        for circuit_idx, cov_mat in var_dict[key].items():
+            cached_cov_mat, factor = var_dict['cholesky'][key][circuit_idx]
+            assert np.array_equal(cached_cov_mat, cov_mat)
+            assert np.allclose(factor @ factor.T, cov_mat)
+
+
+def test_resample_opdm():
+    parameters = np.array([0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9])
+    u = sp.linalg.expm(rhf_params_to_matrix(parameters, 6))
+    opdm = u[:, :3] @ u[:, :3].conj().T
+    var_dict = covariance_construction_from_opdm(opdm, 1000)
+
+    new_opdm = resample_opdm(opdm, var_dict, np.random.default_rng(7))
+    assert np.allclose(new_opdm, new_opdm.T)
+    assert not np.allclose(new_opdm, opdm)
+    assert np.allclose(new_opdm, opdm, atol=0.2)
+
+    # Cached Cholesky factors and on-the-fly factorization agree.
+    uncached_var_dict = {
+        key: val for key, val in var_dict.items() if key != 'cholesky'
+    }
+    assert np.allclose(
+        resample_opdm(opdm, uncached_var_dict, np.random.default_rng(7)),
+        new_opdm)
+
+    rng = np.random.default_rng(11)
+    samples = [resample_opdm(opdm, var_dict, rng) for _ in range(2000)]
+    assert np.allclose(np.mean(samples, axis=0), opdm, atol=5.0E-3)
+
+    # Cached factors are not reused once the covariance they came from changes.
+    var_dict['xy_even'][0] = 4 * var_dict['xy_even'][0]
+    assert np.allclose(
+        resample_opdm(opdm, var_dict, np.random.default_rng(3)),
+        resample_opdm(opdm, uncached_var_dict, np.random.default_rng(3)))
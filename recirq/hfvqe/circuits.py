@@ -153,10 +153,8 @@ def circuits_with_measurements(qubits, circuits,
     """Append the appropriate measurements to each of the permutation circuits.
     """
     num_qubits = len(qubits)
-    even_pairs = [
-        qubits[idx:idx + 2] for idx in np.arange(0, num_qubits - 1, 2)
-    ]
-    odd_pairs = [qubits[idx:idx + 2] for idx in np.arange(1, num_qubits - 1, 2)]
+    even_pairs = [qubits[idx:idx + 2] for idx in range(0, num_qubits - 1, 2)]
+    odd_pairs = [qubits[idx:idx + 2] for idx in range(1, num_qubits - 1, 2)]
     measure_labels = ['z', 'xy_even', 'xy_odd']
     all_circuits_with_measurements = {label: {} for label in measure_labels}
     for circuit_index in range(len(circuits)):
@@ -16,7 +16,6 @@ from typing import Optional
 from itertools import product
 import numpy as np
 from openfermion.ops import InteractionOperator, InteractionRDM
-from openfermion.linalg import wedge
 from openfermion.transforms import get_fermion_operator
 from recirq.hfvqe.circuits import rhf_params_to_matrix
 
@@ -45,6 +44,22 @@ def get_matrix_of_eigs(w: np.ndarray) -> np.ndarray:
     return transform_eigs
 
 
+def slater_determinant_tpdm(opdm: np.ndarray) -> np.ndarray:
+    """Construct the 2-RDM of a Slater determinant from its 1-RDM.
+
+    This is 2 * wedge(opdm, opdm, (1, 1), (1, 1)) written out explicitly.
+
+    Args:
+        opdm: spin-orbital 1-RDM.
+
+    Returns:
+        tpdm[i, j, k, l] = <i^ j^ k l> = opdm[i, l] opdm[j, k] -
+            opdm[i, k] opdm[j, l]
+    """
+    return (np.einsum('il,jk->ijkl', opdm, opdm) -
+            np.einsum('ik,jl->ijkl', opdm, opdm))
+
+
 class RestrictedHartreeFockObjective():
     """Objective function for Restricted Hartree-Fock.
 
@@ -76,8 +91,8 @@ class RestrictedHartreeFockObjective():
         opdm = np.zeros((self.num_qubits, self.num_qubits), dtype=complex)
         opdm[::2, ::2] = opdm_aa
         opdm[1::2, 1::2] = opdm_aa
-        tpdm = wedge(opdm, opdm, (1, 1), (1, 1))
-        rdms = InteractionRDM(opdm, 2 * tpdm)
+        tpdm = slater_determinant_tpdm(opdm)
+        rdms = InteractionRDM(opdm, tpdm)
         return rdms
 
     def energy_from_opdm(self, opdm_aa: np.ndarray) -> float:
@@ -93,7 +108,7 @@ class RestrictedHartreeFockObjective():
         opdm = np.zeros((self.num_qubits, self.num_qubits), dtype=np.complex128)
         opdm[::2, ::2] = alpha_opdm
         opdm[1::2, 1::2] = alpha_opdm
-        tpdm = 2 * wedge(opdm, opdm, (1, 1), (1, 1))
+        tpdm = slater_determinant_tpdm(opdm)
 
         # now go through and generate all the necessary Z, Y, Y_kl matrices
         kappa_matrix = rhf_params_to_matrix(params,
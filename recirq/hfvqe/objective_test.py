@@ -33,7 +33,8 @@ import cirq
 
 from recirq.hfvqe.circuits import \
     prepare_slater_determinant
-from recirq.hfvqe.objective import get_matrix_of_eigs
+from recirq.hfvqe.objective import (get_matrix_of_eigs,
+                                    slater_determinant_tpdm)
 from recirq.hfvqe.circuits import rhf_params_to_matrix
 from recirq.hfvqe.molecular_example import make_h6_1_3
 
@@ -178,3 +179,10 @@ def test_get_matrix_of_eigs():
 
     test_mat_eigs = get_matrix_of_eigs(lam_vals)
     assert np.allclose(test_mat_eigs, mat_eigs)
+
+
+def test_slater_determinant_tpdm():
+    np.random.seed(7)
+    opdm = np.random.randn(4, 4) + 1j * np.random.randn(4, 4)
+    assert np.allclose(slater_determinant_tpdm(opdm),
+                       2 * of.wedge(opdm, opdm, (1, 1), (1, 1)))